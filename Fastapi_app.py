@@ -1,70 +1,167 @@
-from fastapi import FastAPI, HTTPException 
-from pydantic import BaseModel 
-from typing import List
+import json
+import os
+import sqlite3
+import msgspec
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ConfigDict, ValidationError
+from typing import List, Optional, Tuple
 
-app = FastAPI()
+_PRODUCTION = os.getenv("ENV") == "prod"                       # When the ENV environment variable is set to "prod", the OpenAPI schema and the /docs and /redoc pages are turned off, so the schema is never built. In development they stay available.
 
-class ItemCreate(BaseModel):          # BaseModel is used to define the structure of the data we expect when creating an item. 
+app = FastAPI(                                                 # Every route builds its own Response from JSON bytes encoded ahead of time or with msgspec, so the app keeps FastAPI's default response class.
+    docs_url = None if _PRODUCTION else "/docs",
+    redoc_url = None if _PRODUCTION else "/redoc",
+    openapi_url = None if _PRODUCTION else "/openapi.json",
+)
+
+class ItemCreate(msgspec.Struct):     # msgspec.Struct is used to define the structure of the data we expect when creating an item. The request body is decoded and validated in one pass by msgspec, in C, instead of by Pydantic.
     text: str                    
     is_done: bool = False
 
-class Item(ItemCreate):               # Item inherits from ItemCreate, which means it has all the fields of ItemCreate (text and is_done) plus an additional field
+class ItemCreateModel(BaseModel):     # ItemCreateModel is the Pydantic version of ItemCreate. It is only used for a body that msgspec rejects, so such bodies get exactly the 422 errors FastAPI gives for a Pydantic body, and values only Pydantic accepts (like "yes" for is_done) still work.
+    text: str
+    is_done: bool = False
+
+class Item(BaseModel):                # Item has all the fields of ItemCreate (text and is_done) plus an additional id field.
+    model_config = ConfigDict(frozen = True, extra = "forbid")       # Item only describes the shape of the responses in the API docs. Stored items are ItemRecord structs that are never mutated through this model, so it is frozen and rejects unknown fields.
+
+    text: str
+    is_done: bool = False
     id: int
+
+class ItemRecord(msgspec.Struct):     # ItemRecord is a single item read out of the store, used to encode responses. The data is validated once as ItemCreate at the API boundary, and msgspec encodes a struct to JSON in C without walking its fields in Python.
+    id: int
+    text: str
+    is_done: bool
     
-items: List[Item] = []                # This is an in-memory list that will store our items. Each item in the list is an instance of the Item class, which includes an id, text, and is_done status.
-current_id = 1                        # This variable is used to assign unique IDs to each item created. It starts at 1 and increments each time a new item is added to the list.
+_db = sqlite3.connect(":memory:", check_same_thread = False, isolation_level = None)    # The items are stored in an in-memory SQLite database. Lookups by id go through SQLite's primary key B-tree, in C. The handlers all run on the event loop, so a single connection in autocommit mode is shared by all of them.
+_db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, is_done INTEGER NOT NULL)")    # AUTOINCREMENT assigns each new item a unique ID starting at 1 and never hands out the ID of a deleted item again.
+
+_HOT_N = 256                                                    # Number of slots in the hot cache used by get_item. It must be a power of two so that item_id & (_HOT_N - 1) picks a slot.
+_hot: List[Optional[Tuple[int, bytes]]] = [None] * _HOT_N       # A small direct-mapped cache of recently read items. Each slot holds an (id, JSON body) pair, so repeated reads of the same item (polling clients, retries) skip the lookup and the encoding. Every endpoint that changes an item clears its slot.
+_items_json: Optional[bytes] = None                             # The JSON encoded body of GET /items, built once and reused until an item is created, changed or deleted. Every endpoint that changes the items resets it to None.
+
+_encoder = msgspec.json.Encoder()                               # The JSON encoder and the request body decoder are built once, when the module is imported. A decoder works out how to validate its type when it is created, so this work is not repeated on, or delayed until, the first request.
+_create_decoder = msgspec.json.Decoder(ItemCreate, strict = False)    # strict = False lets is_done be sent as 0/1 or "true"/"false" as well as a JSON boolean, as it could be when Pydantic parsed the body.
+
+_ITEM_CREATE_BODY = {"requestBody": {"required": True, "content": {"application/json": {"schema": msgspec.json.schema_components([ItemCreate])[1]["ItemCreate"]}}}}    # Bodies read through _parse_item_create are invisible to FastAPI, so the routes that take an ItemCreate describe it in the OpenAPI schema (and /docs) with this JSON schema generated by msgspec.
+
+def _execute_for_id(sql: str, params: tuple) -> sqlite3.Cursor:    # Runs a statement whose parameters include an item ID from the path. SQLite integers are 64-bit, so sqlite3 raises OverflowError for a larger ID. No item can have such an ID, so it is answered with 404 (Not Found) like any other unknown ID.
+    try:
+        return _db.execute(sql, params)
+    except OverflowError:
+        raise HTTPException(status_code = 404, detail = "Item not found")
+
+def _record(row: Optional[tuple]) -> Optional[ItemRecord]:     # Turns an (id, text, is_done) row into an ItemRecord, or returns None if there is no row. SQLite stores is_done as 0 or 1, so it is turned back into a bool.
+    if row is None:
+        return None
+    return ItemRecord(id = row[0], text = row[1], is_done = bool(row[2]))
+
+def _json_response(content, status_code = 200) -> Response:      # Encodes an ItemRecord with msgspec. FastAPI's own encoders do not know msgspec structs, so the item endpoints build their responses with this helper; their response_model is then only used for the API docs.
+    return Response(content = _encoder.encode(content), status_code = status_code, media_type = "application/json")
+
+async def _parse_item_create(request: Request) -> ItemCreate:   # Reads the request body as an ItemCreate. msgspec decodes valid bodies. Anything it rejects goes through the same steps FastAPI takes for a Pydantic body: an empty body is a missing field, invalid JSON is a JSON decode error, and everything else is validated by ItemCreateModel.
+    body = await request.body()
+    try:
+        return _create_decoder.decode(body)
+    except msgspec.DecodeError:
+        pass
+    if not body:
+        raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error", "input": {}, "ctx": {"error": e.msg}}])
+    try:
+        model = ItemCreateModel.model_validate(data, from_attributes = True)
+    except ValidationError as e:                                 # Pydantic reports loc relative to the model, while FastAPI puts "body" in front of it.
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url = False)])
+    return ItemCreate(text = model.text, is_done = model.is_done)
+
+_ROOT_JSON = b'{"message":"FastAPI is running"}'                 # The home route always returns the same message, so its JSON body is written out once here instead of being encoded on every request.
 
 # Home route
 @app.get("/")                        
-def root():
-    return {"message": "FastAPI is running"}
+async def root():
+    return Response(content = _ROOT_JSON, media_type = "application/json")
 
 # Create Item
-@app.post("/items", response_model = Item, status_code = 201)               # This endpoint allows clients to create a new item. It expects a JSON payload that matches the ItemCreate model (text and is_done). When a new item is created, it assigns a unique ID to the item, adds it to the items list, and returns the newly created item with a 201 status code indicating that the resource was successfully created.
-def create_item(item: ItemCreate):                                          # The function takes an item of type ItemCreate as input, which is automatically validated by FastAPI based on the defined model. The function then creates a new Item instance, assigns it a unique ID, and appends it to the items list before returning the new item.
-    global current_id                                                       # The global keyword is used to indicate that we want to modify the current_id variable defined outside the function. This allows us to keep track of the unique IDs for each item created across multiple function calls.  
-    new_item = Item(id = current_id, **item.dict())                         # The **item.dict() syntax is used to unpack the fields of the item (text and is_done) into the new Item instance. This allows us to create a new Item with the same text and is_done values as the input item, while also assigning it a unique ID.
-    current_id += 1                                                         # After creating the new item, we increment the current_id variable to ensure that the next item created will receive a unique ID. This way, each item in our list will have a distinct identifier.
-    item.append(new_item)                                                   # We append the newly created item to the items list, which serves as our in-memory storage for all items. This allows us to keep track of all the items that have been created and perform operations on them (like retrieval, updating, toggling, and deletion) in subsequent API endpoints.
-    return new_item                                                         # The function returns the newly created item, which includes its unique ID, text, and is_done status. This response will be sent back to the client that made the POST request to create the item.
+@app.post("/items", response_model = Item, status_code = 201, openapi_extra = _ITEM_CREATE_BODY)    # This endpoint allows clients to create a new item. It expects a JSON payload that matches the ItemCreate model (text and is_done). When a new item is created, it is inserted as a new row of the items table, which assigns it a unique ID, and the endpoint returns the newly created item with a 201 status code indicating that the resource was successfully created.
+async def create_item(item: ItemCreate = Depends(_parse_item_create)):      # The function takes an item of type ItemCreate as input, which is decoded and validated by _parse_item_create based on the defined struct. The function then inserts the item into the items table, reads back the new row with its unique ID as an ItemRecord, and returns it.
+    global _items_json                                                      # The global keyword is used to indicate that we want to modify the _items_json variable defined outside the function.
+    cursor = _db.execute("INSERT INTO items (text, is_done) VALUES (?, ?)", (item.text, item.is_done))    # The fields of the item (text and is_done) are inserted as a new row, and SQLite assigns its unique ID, which cursor.lastrowid reports. _parse_item_create has already validated the incoming ItemCreate, so nothing is validated again here.
+    new_item = ItemRecord(id = cursor.lastrowid, text = item.text, is_done = item.is_done)    # The new item is built from the values just inserted, so it does not have to be read back.
+    _items_json = None                                                      # The stored items changed, so the cached GET /items body is out of date.
+    return _json_response(new_item, status_code = 201)                      # The function returns the newly created item, which includes its unique ID, text, and is_done status. This response will be sent back to the client that made the POST request to create the item.
 
 # GET all items
-@app.get("/items", response_model = List[Item])                             # This endpoint allows clients to retrieve a list of all items currently stored in the items list. The response model is defined as List[Item], which means that the endpoint will return a JSON array of Item objects, each containing an id, text, and is_done status.                 
-def get_items():                                                            # The function simply returns the entire items list, which contains all the items that have been created. This allows clients to see all the items that are currently stored in the application.  
-    return items                                                            # The function returns the items list, which is a collection of all the Item instances that have been created and stored in memory. 
+@app.get("/items", response_model = List[Item])                             # This endpoint allows clients to retrieve a list of all items currently stored as a JSON array of Item objects, each containing an id, text, and is_done status. The route returns a raw Response holding already encoded JSON, so FastAPI neither validates nor serializes it; response_model only documents the array of Item objects in the API docs.
+async def get_items():                                                      # The function returns all the items stored in the items table. The JSON body is served from the _items_json cache; only when the cache has been reset does the function read the rows with a SELECT and encode them again.
+    global _items_json
+    if _items_json is None:                                                 # The items were changed since the list was last encoded (or it was never encoded), so we encode the stored items, in the order they were created, and keep the bytes.
+        rows = _db.execute("SELECT id, text, is_done FROM items ORDER BY id").fetchall()
+        _items_json = _encoder.encode([{"id": i, "text": t, "is_done": bool(d)} for i, t, d in rows])
+    return Response(content = _items_json, media_type = "application/json")  # The cached bytes are sent as they are, so repeated reads of an unchanged list are not serialized again.
 
 # GET item by ID
 @app.get("/items/{item_id}", response_model = Item)                             # This endpoint allows clients to retrieve a specific item by its ID. The response model is defined as Item, which means that the endpoint will return a JSON object representing the item with the specified ID.
-def get_item(item_id: int):                                                     # The function takes an item_id as a path parameter as an integer.
-    for item in items:                                                          # The function iterates through the items list to find an item with a matching ID. If it finds an item with the specified ID, it returns that item. 
-        if item.id == item_id:                                                  # If the current item in the iteration has an ID that matches the item_id provided in the path parameter, we return that item as the response to the client. The returned item will include its id, text, and is_done status as defined in the Item model.
-            return item                                                         # If the function finishes iterating through the items list without finding an item with the specified ID.
-    raise HTTPException(status_code = 404, detail = "Item not found")           # This line is executed if the function does not find an item with the specified ID in the items list. It raises an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found".
+async def get_item(item_id: int):                                               # The function takes an item_id as a path parameter as an integer.
+    slot = item_id & (_HOT_N - 1)                                               # The hot cache slot this ID maps to.
+    entry = _hot[slot]
+    if entry is not None and entry[0] == item_id:                               # The slot can be shared by several IDs, so we only use it if it holds this exact ID.
+        return Response(content = entry[1], media_type = "application/json")
+    item = _record(_execute_for_id("SELECT id, text, is_done FROM items WHERE id = ?", (item_id,)).fetchone())    # On a cache miss, the function looks the item up by its ID. If no item with that ID exists, we get None.
+    if item is None:                                                            # If there is no item with the specified ID, we raise an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found".
+        raise HTTPException(status_code = 404, detail = "Item not found")
+    body = _encoder.encode(item)                                                # The returned item will include its id, text, and is_done status as defined in the Item model.
+    _hot[slot] = (item_id, body)                                                # Remember the encoded item so the next read of the same ID is served from the hot cache.
+    return Response(content = body, media_type = "application/json")
 
 # PUT (Update)
-@app.put("/items/{item_id}", response_model = Item)                                # This endpoint allows clients to update an existing item by its ID. The response model is defined as Item, which means that the endpoint will return a JSON object representing the updated item after the update operation is performed.  
-def update_item(item_id: int, updated_item: ItemCreate):                           # The function takes an item_id as a path parameter and an updated_item of type ItemCreate as the request body. The updated_item contains the new text and is_done status that the client wants to set for the item with the specified ID.
-    for index, item in enumerate(items):                                           # The function iterates through the items list using enumerate, which provides both the index and the item itself. This allows us to keep track of the position of each item in the list, which is necessary for updating the item in place if we find a match.
-        if item.id == item_id:                                                     # If the current item in the iteration has an ID that matches the item_id provided in the path parameter, we proceed to update that item. We create a new Item instance called updated, which combines the existing item's ID with the new text and is_done values from the updated_item. 
-            updated = Item(id = item_id, **updated_item.dict())                    # The **updated_item.dict() syntax is used to unpack the fields of the updated_item (text and is_done) into the new Item instance. This allows us to create a new Item with the same text and is_done values as the updated_item, while also keeping the same ID as the original item.
-            items[index] = updated                                                 # We update the item in the items list at the current index with the new updated item. This effectively replaces the old item with the new one that has the updated text and is_done status.
-            return updated                                                         # The function returns the updated item. This response will be sent back to the client that made the PUT request to update the item. 
-        raise HTTPException(status_code = 404, detail = "Item not found")          # If the function finishes iterating through the items list without finding an item with the specified ID, it raises an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found". This indicates to the client that the item they attempted to update does not exist in the items list. 
+@app.put("/items/{item_id}", response_model = Item, openapi_extra = _ITEM_CREATE_BODY)    # This endpoint allows clients to update an existing item by its ID. The response model is defined as Item, which means that the endpoint will return a JSON object representing the updated item after the update operation is performed.  
+async def update_item(item_id: int, updated_item: ItemCreate = Depends(_parse_item_create)):    # The function takes an item_id as a path parameter and an updated_item of type ItemCreate as the request body. The updated_item contains the new text and is_done status that the client wants to set for the item with the specified ID.
+    global _items_json
+    updated = _execute_for_id("UPDATE items SET text = ?, is_done = ? WHERE id = ?", (updated_item.text, updated_item.is_done, item_id)).rowcount    # We write the already validated text and is_done values into the item's row, keeping its ID. rowcount is the number of rows updated, which is 0 if there is no item with that ID.
+    if updated == 0:                                                               # If there is no item with the specified ID, we raise an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found". This indicates to the client that the item they attempted to update does not exist.
+        raise HTTPException(status_code = 404, detail = "Item not found")
+    item = ItemRecord(id = item_id, text = updated_item.text, is_done = updated_item.is_done)    # The updated item is built from the values just written, so it does not have to be read back.
+    _hot[item_id & (_HOT_N - 1)] = None                                            # The hot cache may still hold the old item, so we clear its slot.
+    _items_json = None                                                             # The stored items changed, so the cached GET /items body is out of date.
+    return _json_response(item)                                                    # The function returns the updated item. This response will be sent back to the client that made the PUT request to update the item. 
     
 # TOGGLE item (Partial Update)
 @app.patch("/items/{item_id}/toggle", response_model = Item)                      # The response model is defined as Item, which means that the endpoint will return a JSON object representing the updated item after the toggle operation is performed. The endpoint is accessed via a PATCH request (updates some field inside that item) to "/items/{item_id}/toggle", where {item_id} is the ID of the item to be toggled.
-def toggle_item(item_id: int):                                                    # The function takes an item_id as a path parameter, which is used to identify the specific item that the client wants to toggle. 
-    for item in items:                                                            # The function iterates through the items list to find an item with a matching ID. If it finds an item with the specified ID, it toggles the is_done status of that item (i.e., if is_done is True, it becomes False, and if it is False, it becomes True) and returns the updated item. 
-        if item.id == item_id:                                                    # If the current item in the iteration has an ID that matches the item_id provided in the path parameter, we proceed to toggle that item. We change the is_done status of the item to its opposite value (if it was True, it becomes False, and if it was False, it becomes True).
-            item.is_done = not item.is_done                                       # After toggling the is_done status, we return the updated item. This response will be sent back to the client that made the PATCH request to toggle the item. 
-            return item                                                           # If the function finishes iterating through the items list without finding an item with the specified ID, it raises an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found". 
-    raise HTTPException(status_code = 404, detail = "Item not found")     
+async def toggle_item(item_id: int):                                              # The function takes an item_id as a path parameter, which is used to identify the specific item that the client wants to toggle. 
+    global _items_json
+    toggled = _execute_for_id("UPDATE items SET is_done = NOT is_done WHERE id = ?", (item_id,)).rowcount    # We change the is_done status of the item to its opposite value (if it was True, it becomes False, and if it was False, it becomes True). rowcount is 0 if there is no item with that ID.
+    if toggled == 0:                                                              # If there is no item with the specified ID, it raises an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found". 
+        raise HTTPException(status_code = 404, detail = "Item not found")
+    item = _record(_db.execute("SELECT id, text, is_done FROM items WHERE id = ?", (item_id,)).fetchone())    # The toggled item is read back, since only SQLite knows its new is_done status.
+    _hot[item_id & (_HOT_N - 1)] = None                                           # The hot cache may still hold the old item, so we clear its slot.
+    _items_json = None                                                            # The stored items changed, so the cached GET /items body is out of date.
+    return _json_response(item)                                                   # After toggling the is_done status, we return the updated item. This response will be sent back to the client that made the PATCH request to toggle the item. 
 
 # DELETE item
-@app.delete("/items/{item_id}")                                                   # This endpoint allows clients to delete a specific item by its ID. The endpoint is accessed via a DELETE request to "/items/{item_id}", where {item_id} is the ID of the item to be deleted. The function does not specify a response model, which means it will return a JSON object with a message and the deleted item if the deletion is successful, or an error message if the item is not found.
-def delete_item(item_id: int):                                                    # The function takes an item_id as a path parameter, which is used to identify the specific item that the client wants to delete. 
-    for index, item in enumerate(items):                                          # The function iterates through the items list using enumerate, which provides both the index and the item itself. This allows us to keep track of the position of each item in the list, which is necessary for removing the item from the list if we find a match.
-        if item.id == item_id:                                                    # If the current item in the iteration has an ID that matches the item_id provided in the path parameter, we proceed to delete that item. We use the pop method of the list to remove the item at the current index and store it in a variable called deleted_item. This allows us to return information about the deleted item in the response.
-            deleted_item = items.pop(index)                                       # After deleting the item from the items list, we return a JSON object containing a message indicating that the item was deleted and the details of the deleted item. This response will be sent back to the client that made the DELETE request to delete the item.
-            return {"message": "Item deleted", "item": deleted_item}              # If the function finishes iterating through the items list without finding an item with the specified ID, it raises an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found". 
-    raise HTTPException(status_code = 404, detail = "Item not found")     
\ No newline at end of file
+@app.delete("/items/{item_id}", status_code = 204)                                # This endpoint allows clients to delete a specific item by its ID. The endpoint is accessed via a DELETE request to "/items/{item_id}", where {item_id} is the ID of the item to be deleted. A successful deletion is answered with 204 (No Content) and an empty body, since the client already knows which item it deleted, or with an error message if the item is not found.
+async def delete_item(item_id: int):                                              # The function takes an item_id as a path parameter, which is used to identify the specific item that the client wants to delete. 
+    global _items_json
+    deleted = _execute_for_id("DELETE FROM items WHERE id = ?", (item_id,)).rowcount    # We delete the item's row. rowcount is the number of rows deleted, which is 0 if there is no item with that ID.
+    if deleted == 0:                                                              # If there is no item with the specified ID, it raises an HTTPException with a status code of 404 (Not Found) and a detail message "Item not found". 
+        raise HTTPException(status_code = 404, detail = "Item not found")
+    _hot[item_id & (_HOT_N - 1)] = None                                           # Clear the hot cache slot so the deleted item can no longer be served from it.
+    _items_json = None                                                            # The stored items changed, so the cached GET /items body is out of date.
+    return Response(status_code = 204)                                            # Nothing is encoded for the response.
+
+# Run app
+if __name__ == "__main__":                      # Checks if the script is being run directly (python Fastapi_app.py) rather than imported by an ASGI server.
+    from importlib.util import find_spec
+    import uvicorn
+
+    uvicorn.run(                                # Starts uvicorn with uvloop (a libuv based event loop) and httptools (a C HTTP parser) instead of the pure Python asyncio loop and h11 parser. When either package is not installed, uvicorn picks its own default ("auto") so the app still starts. Access logging is turned off because it formats and writes a log line for every request.
+        "Fastapi_app:app",
+        port = 8000,
+        loop = "uvloop" if find_spec("uvloop") else "auto",
+        http = "httptools" if find_spec("httptools") else "auto",
+        access_log = False,
+    )